@@ -1,31 +1,33 @@
-from bs4 import BeautifulSoup
+import csv
 
+from bs4 import BeautifulSoup, SoupStrainer
 
-with open("data.html", "r") as f:
-    html_text = f.read()
 
-# Suppose 'html_text' contains all the pasted HTML.
-soup = BeautifulSoup(html_text, 'html.parser')
-
-# Extract display text from each <li><a> item
-display_list = [a.get_text() for a in soup.find_all('a')]
+# Parse only the <a> tags with lxml; the file is opened as bytes so lxml detects the encoding
+only_a = SoupStrainer("a")
+with open("data.html", "rb") as f:
+    soup = BeautifulSoup(f, "lxml", parse_only=only_a)
 
 def swap_comma_text(input_string):
-    if ',' in input_string:
-        parts = [part.strip() for part in input_string.split(',')]
-        # Swap first and second, concatenate rest (if any)
-        if len(parts) > 2:
-            return ' '.join([parts[1], *parts[2:], parts[0]])
-        else:
-            return ' '.join([parts[1], parts[0]])
-    else:
+    head, sep, tail = input_string.partition(',')
+    if not sep:
         return input_string.strip()
-
-
-# Apply transformation:
-result_list = [swap_comma_text(item) for item in display_list]
-
-with open("list_wiki.csv","w") as file:
-    file.write("\n".join(result_list))
-
-
+    # Common "Surname, Given" case needs no intermediate list
+    if ',' not in tail:
+        return f"{tail.strip()} {head.strip()}"
+    parts = [part.strip() for part in input_string.split(',')]
+    # Swap first and second, concatenate rest
+    return ' '.join([parts[1], *parts[2:], parts[0]])
+
+
+# Transform the display text of each <li><a> item and stream it out row by row
+with open("list_wiki.csv", "w", newline="", encoding="utf-8") as file:
+    writer = csv.writer(file)
+    for a in soup.find_all('a'):
+        text = a.get_text()
+        # Inline the two-part fast path to skip a function call per heading
+        head, sep, tail = text.partition(',')
+        if sep and ',' not in tail:
+            writer.writerow([f"{tail.strip()} {head.strip()}"])
+        else:
+            writer.writerow([swap_comma_text(text)])
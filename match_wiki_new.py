@@ -1,9 +1,21 @@
+import argparse
 import csv
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import diskcache
+import orjson
 import requests
-from rapidfuzz.fuzz import token_sort_ratio
-import time
+from requests.adapters import HTTPAdapter
+from rapidfuzz import process
+from rapidfuzz import fuzz
 import logging
 import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 # Configure logging
 logging.basicConfig(
@@ -17,13 +29,107 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 WIKIDATA_API = "https://www.wikidata.org/w/api.php"
-SPARQL_ENDPOINT = "https://query.wikidata.org/sparql"
 
 # User-Agent for Wikimedia compliance
 HEADERS = {
-    'User-Agent': 'WikidataProcessor/1.0 (https://example.com/contact) requests/2.31.0'
+    'User-Agent': 'WikidataProcessor/1.0 (https://example.com/contact) requests/2.31.0',
+    'Accept-Encoding': 'gzip, deflate'
 }
 
+OUTPUT_HEADER = [
+    "Keyword", "Wikidata_QID", "Wikidata_Label", "Match_Score",
+    "Instances_QIDs", "Instances_Labels",
+    "Subclasses_QIDs", "Subclasses_Labels",
+    "Wikipedia_English_Link"
+]
+
+# Shared session so TLS connections are kept alive across requests
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+POOL_MAXSIZE = 32
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+SESSION.mount("https://www.wikidata.org", _adapter)
+
+# Default number of keywords looked up in parallel; capped at POOL_MAXSIZE
+MAX_WORKERS = 8
+
+# Retries for HTTP 429/503 responses before giving up
+MAX_RETRIES = 5
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests/second with bursts up to `burst`."""
+
+    def __init__(self, rate=5.0, burst=10):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+RATE_LIMITER = TokenBucket()
+
+# Persistent cache of API responses so re-runs skip identical requests
+CACHE = diskcache.Cache("./wikidata_cache", size_limit=2**31)
+CACHE_TTL = 7 * 86400
+
+def _retry_delay(r, attempt):
+    """Seconds to wait before retrying, honouring a Retry-After header if present."""
+    retry_after = r.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0, int(retry_after))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    return min(60, 2 ** attempt)
+
+def _get(url, params, timeout=30):
+    """Rate-limited GET that retries on 429/503 with backoff and jitter."""
+    for attempt in range(MAX_RETRIES + 1):
+        RATE_LIMITER.acquire()
+        r = SESSION.get(url, params=params, timeout=timeout)
+        if r.status_code not in (429, 503) or attempt == MAX_RETRIES:
+            break
+        delay = _retry_delay(r, attempt) + random.uniform(0, 0.5)
+        logger.warning(f"HTTP {r.status_code} from {url}, retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+    r.raise_for_status()
+    logger.debug(f"{url} returned {len(r.content)} bytes, Content-Encoding: {r.headers.get('Content-Encoding')}")
+    return r
+
+def _json(r):
+    """Decode a response body with orjson, which is much faster than the stdlib parser."""
+    return orjson.loads(r.content)
+
+def _cached_get(url, params, timeout=30):
+    """Return the JSON body for a GET request, served from the disk cache when possible."""
+    key = hashlib.sha256(f"{url}|{sorted(params.items())}".encode()).hexdigest()
+    data = CACHE.get(key)
+    if data is None:
+        data = _json(_get(url, params, timeout=timeout))
+        # The Action API reports errors (maxlag, ratelimited, ...) with HTTP 200
+        if "error" in data:
+            error = data["error"]
+            raise requests.HTTPError(f"Wikidata API error {error.get('code')}: {error.get('info')}")
+        CACHE.set(key, data, expire=CACHE_TTL)
+    return data
+
 def search_wikidata_entities(keyword, language="en", limit=5):
     params = {
         "action": "wbsearchentities",
@@ -33,9 +139,8 @@ def search_wikidata_entities(keyword, language="en", limit=5):
         "limit": limit,
     }
     try:
-        r = requests.get(WIKIDATA_API, params=params, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        return r.json().get("search", [])
+        data = _cached_get(WIKIDATA_API, params, timeout=30)
+        return data.get("search", [])
     except Exception as e:
         logger.error(f"Error searching Wikidata for '{keyword}': {e}")
         return []
@@ -48,9 +153,8 @@ def get_wikipedia_link(qid, language="en"):
         "props": "sitelinks/urls"
     }
     try:
-        r = requests.get(WIKIDATA_API, params=params, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        entities = r.json().get("entities", {})
+        data = _cached_get(WIKIDATA_API, params, timeout=30)
+        entities = data.get("entities", {})
         sitelinks = entities.get(qid, {}).get("sitelinks", {})
         site_key = f"{language}wiki"
         if site_key in sitelinks:
@@ -60,204 +164,345 @@ def get_wikipedia_link(qid, language="en"):
         logger.error(f"Error fetching Wikipedia link for {qid}: {e}")
         return ""
 
-def get_instances_and_subclasses(qid, language="en"):
-    query = f"""
-    SELECT ?p31 ?p31Label ?p279 ?p279Label WHERE {{
-      OPTIONAL {{
-        wd:{qid} wdt:P31 ?p31.
-        SERVICE wikibase:label {{ bd:serviceParam wikibase:language "[AUTO_LANGUAGE],{language}". }}
-      }}
-      OPTIONAL {{
-        wd:{qid} wdt:P279 ?p279.
-        SERVICE wikibase:label {{ bd:serviceParam wikibase:language "[AUTO_LANGUAGE],{language}". }}
-      }}
-    }}
+def get_entity_label(qid, language="en"):
+    params = {
+        "action": "wbgetentities",
+        "ids": qid,
+        "format": "json",
+        "props": "labels",
+        "languages": language
+    }
+    try:
+        data = _cached_get(WIKIDATA_API, params, timeout=15)
+        return data["entities"].get(qid, {}).get("labels", {}).get(language, {}).get("value", "")
+    except Exception as e:
+        logger.error(f"Error fetching label for {qid}: {e}")
+        return ""
+
+def batch_get_entities(qids, props="labels|sitelinks/urls", language="en"):
+    """Fetch several entities with one wbgetentities call per 50 ids."""
+    entities = {}
+    for i in range(0, len(qids), 50):
+        params = {
+            "action": "wbgetentities",
+            "ids": "|".join(qids[i:i + 50]),
+            "format": "json",
+            "props": props,
+            "languages": language
+        }
+        data = _cached_get(WIKIDATA_API, params, timeout=30)
+        entities.update(data.get("entities", {}))
+    return entities
+
+def _claim_qids(entity, prop):
+    """Return the QIDs of an entity's truthy (best-rank) statements for prop."""
+    claims = [c for c in entity.get("claims", {}).get(prop, []) if c.get("rank") != "deprecated"]
+    if any(c.get("rank") == "preferred" for c in claims):
+        claims = [c for c in claims if c.get("rank") == "preferred"]
+    return sorted({
+        c["mainsnak"]["datavalue"]["value"]["id"]
+        for c in claims
+        if c.get("mainsnak", {}).get("snaktype") == "value"
+    })
+
+def resolve_instances_and_subclasses(entity_data, language="en"):
+    """Map each fetched entity to its P31/P279 QIDs and labels.
+
+    Labels of all referenced classes are fetched with a single extra
+    wbgetentities request; a QID stands in for any missing label.
     """
-    headers = {**HEADERS, 'Accept': 'application/sparql-results+json'}
+    claims = {qid: (_claim_qids(ent, "P31"), _claim_qids(ent, "P279")) for qid, ent in entity_data.items()}
+    ref_qids = sorted({q for p31, p279 in claims.values() for q in p31 + p279})
 
-    max_retries = 3
-    for attempt in range(max_retries):
+    labels = {}
+    if ref_qids:
         try:
-            r = requests.get(SPARQL_ENDPOINT, params={'query': query}, headers=headers, timeout=30)
-
-            if r.status_code == 429:
-                logger.warning(f"Rate limited for {qid}, waiting 10 seconds...")
-                time.sleep(10)
-                continue
+            refs = batch_get_entities(ref_qids, props="labels", language=language)
+            labels = {
+                q: ent.get("labels", {}).get(language, {}).get("value", q)
+                for q, ent in refs.items()
+            }
+        except Exception as e:
+            logger.error(f"Error fetching class labels for {', '.join(ref_qids)}: {e}")
+
+    return {
+        qid: (
+            p31, sorted({labels.get(q, q) for q in p31}),
+            p279, sorted({labels.get(q, q) for q in p279}),
+        )
+        for qid, (p31, p279) in claims.items()
+    }
 
-            r.raise_for_status()
-            results = r.json()["results"]["bindings"]
+def get_instances_and_subclasses(qid, language="en"):
+    if not qid:
+        return [], [], [], []
+    try:
+        entity_data = batch_get_entities([qid], props="claims", language=language)
+    except Exception as e:
+        logger.error(f"Error fetching claims for {qid}: {e}")
+        return [], [], [], []
+    return resolve_instances_and_subclasses(entity_data, language).get(qid, ([], [], [], []))
 
-            p31_qids = sorted({res["p31"]["value"].split("/")[-1] for res in results if "p31" in res})
-            p31_labels = sorted({res["p31Label"]["value"] for res in results if "p31Label" in res})
-            p279_qids = sorted({res["p279"]["value"].split("/")[-1] for res in results if "p279" in res})
-            p279_labels = sorted({res["p279Label"]["value"] for res in results if "p279Label" in res})
+def _scan_output(path):
+    """Scan an existing output CSV once for resuming.
 
-            # Rate limiting - wait between SPARQL requests
-            time.sleep(0.5)
+    Returns (needs_header, processed keywords, safe_offset), where safe_offset
+    is the byte offset just past the last complete row. Anything beyond it is
+    a row left half-written by an interrupted run.
+    """
+    if not os.path.exists(path):
+        return True, set(), 0
 
-            return p31_qids, p31_labels, p279_qids, p279_labels
+    size = os.path.getsize(path)
+    processed = set()
+    offset = 0
+    safe_offset = 0
+    last_line = ""
 
-        except Exception as e:
-            logger.error(f"SPARQL error for {qid} (attempt {attempt + 1}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)  # Exponential backoff
+    try:
+        with open(path, 'rb', buffering=1 << 20) as f:
+            def lines():
+                nonlocal offset, last_line
+                for line in f:
+                    offset += len(line)
+                    last_line = line.decode('utf-8', errors='replace')
+                    yield last_line
+
+            reader = csv.reader(lines())
+            header_seen = False
+            for row in reader:
+                complete = last_line.endswith("\n") and len(row) >= len(OUTPUT_HEADER)
+                if not complete and offset == size:
+                    break  # Truncated final row
+                safe_offset = offset
+                if not header_seen:
+                    header_seen = True
+                elif row:
+                    processed.add(row[0].strip())
+    except csv.Error as e:
+        if offset < size:
+            # Malformed row with valid data after it; never truncate in this case
+            logger.error(f"Error parsing {path} before end of file: {e}")
+            return False, processed, size
+        # Otherwise the final row was cut short; keep safe_offset
+    except Exception as e:
+        logger.error(f"Error reading existing file {path}: {e}")
+        return size == 0, processed, size
 
-    return [], [], [], []
+    return safe_offset == 0, processed, safe_offset
 
-def get_processed_keywords(matched_csv, unmatched_csv):
-    """Get set of already processed keywords from existing CSV files."""
-    processed = set()
+def _fetch_hits(keyword, wikidata_limit=5):
+    """Search Wikidata for a keyword and resolve each hit's label, aliases, classes and link."""
+    entities = search_wikidata_entities(keyword, limit=wikidata_limit)
+    hits = []
 
-    for csv_file in [matched_csv, unmatched_csv]:
-        if os.path.exists(csv_file):
-            try:
-                with open(csv_file, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    next(reader, None)  # Skip header
-                    for row in reader:
-                        if row:
-                            processed.add(row[0].strip())
-            except Exception as e:
-                logger.error(f"Error reading existing file {csv_file}: {e}")
-
-    return processed
-
-def should_write_header(csv_file):
-    """Check if CSV file is empty or doesn't exist (needs header)."""
-    if not os.path.exists(csv_file):
-        return True
+    # Resolve labels, Wikipedia links and P31/P279 claims for all hits in one request
+    qids = [ent["id"] for ent in entities if ent.get("id")]
     try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            return len(f.read().strip()) == 0
-    except:
-        return True
-
-def process_keywords(input_csv, matched_csv, unmatched_csv, wikidata_limit=5, min_score=80):
-    # Get already processed keywords for resumability
-    processed_keywords = get_processed_keywords(matched_csv, unmatched_csv)
+        entity_data = batch_get_entities(qids, props="labels|sitelinks/urls|claims") if qids else {}
+        classes = resolve_instances_and_subclasses(entity_data)
+    except Exception as e:
+        logger.error(f"Error batch fetching entities for '{keyword}': {e}")
+        entity_data = None
+
+    for ent in entities:
+        label = ent.get("label", "")
+        qid = ent.get("id", "")
+        if entity_data is not None:
+            data = entity_data.get(qid, {})
+            if not label:
+                label = data.get("labels", {}).get("en", {}).get("value", "")
+            wiki_link = data.get("sitelinks", {}).get("enwiki", {}).get("url", "")
+            inst_qids, inst_labels, sub_qids, sub_labels = classes.get(qid, ([], [], [], []))
+        else:
+            # Fallback: fetch label, link and classes one entity at a time
+            if not label and qid:
+                label = get_entity_label(qid)
+            wiki_link = get_wikipedia_link(qid)
+            inst_qids, inst_labels, sub_qids, sub_labels = get_instances_and_subclasses(qid)
+
+        hits.append((
+            qid, label, ent.get("aliases", []),
+            inst_qids, inst_labels, sub_qids, sub_labels,
+            wiki_link
+        ))
+
+    return hits
+
+def _score_hits(keyword, hits, min_score=80):
+    """Score fetched hits against one spelling of a keyword and split them into matched and unmatched rows."""
+    matched_items = []
+    unmatched_items = []
+
+    for qid, label, aliases, inst_qids, inst_labels, sub_qids, sub_labels, wiki_link in hits:
+        # Score the label and all aliases in one C-level pass; rapidfuzz preprocesses the keyword once
+        choices = ([label] if label else []) + list(aliases)
+        best = process.extractOne(keyword, choices, scorer=fuzz.token_sort_ratio) if choices else None
+        best_score = best[1] if best else 0
+
+        result_row = [
+            keyword,
+            qid,
+            label,
+            best_score,
+            "; ".join(inst_qids), "; ".join(inst_labels),
+            "; ".join(sub_qids), "; ".join(sub_labels),
+            wiki_link
+        ]
+
+        if best_score >= min_score:
+            matched_items.append(result_row)
+        else:
+            unmatched_items.append(result_row)
+
+    return matched_items, unmatched_items
+
+def process_keywords(input_csv, matched_csv, unmatched_csv, wikidata_limit=5, min_score=80, max_workers=MAX_WORKERS):
+    if max_workers > POOL_MAXSIZE:
+        logger.warning(f"Limiting workers to the connection pool size ({POOL_MAXSIZE})")
+        max_workers = POOL_MAXSIZE
+
+    # Scan existing outputs once for resumability, dropping any half-written final row
+    processed_keywords = set()
+    needs_header = {}
+    for csv_file in (matched_csv, unmatched_csv):
+        needs_header[csv_file], processed, safe_offset = _scan_output(csv_file)
+        processed_keywords |= processed
+        del processed
+        if os.path.exists(csv_file) and safe_offset < os.path.getsize(csv_file):
+            logger.warning(f"Truncating incomplete final row in {csv_file}")
+            with open(csv_file, 'r+b') as f:
+                f.seek(safe_offset)
+                f.truncate()
     logger.info(f"Found {len(processed_keywords)} already processed keywords")
 
-    # Check if we need to write headers
-    write_matched_header = should_write_header(matched_csv)
-    write_unmatched_header = should_write_header(unmatched_csv)
-
     with open(input_csv, newline='', encoding='utf-8') as infile, \
-         open(matched_csv, 'a', newline='', encoding='utf-8') as matchedfile, \
-         open(unmatched_csv, 'a', newline='', encoding='utf-8') as unmatchedfile:
+         open(matched_csv, 'a', newline='', encoding='utf-8', buffering=1 << 16) as matchedfile, \
+         open(unmatched_csv, 'a', newline='', encoding='utf-8', buffering=1 << 16) as unmatchedfile:
 
         reader = csv.reader(infile)
         matched_writer = csv.writer(matchedfile)
         unmatched_writer = csv.writer(unmatchedfile)
 
         # Write headers only if files are new/empty
-        if write_matched_header:
-            matched_writer.writerow([
-                "Keyword", "Wikidata_QID", "Wikidata_Label", "Match_Score",
-                "Instances_QIDs", "Instances_Labels",
-                "Subclasses_QIDs", "Subclasses_Labels",
-                "Wikipedia_English_Link"
-            ])
+        if needs_header[matched_csv]:
+            matched_writer.writerow(OUTPUT_HEADER)
             matchedfile.flush()
 
-        if write_unmatched_header:
-            unmatched_writer.writerow([
-                "Keyword", "Wikidata_QID", "Wikidata_Label", "Match_Score",
-                "Instances_QIDs", "Instances_Labels",
-                "Subclasses_QIDs", "Subclasses_Labels",
-                "Wikipedia_English_Link"
-            ])
+        if needs_header[unmatched_csv]:
+            unmatched_writer.writerow(OUTPUT_HEADER)
             unmatchedfile.flush()
 
-        processed_count = 0
-        skipped_count = 0
-
+        # Group spellings that differ only in case or whitespace so each group is searched once;
+        # every distinct spelling still gets its own scored rows
+        groups = {}
+        total_count = 0
         for row in reader:
             if not row:
                 continue
             keyword = row[0].strip()
             if not keyword:
                 continue
+            total_count += 1
+            spellings = groups.setdefault(" ".join(keyword.split()).lower(), [])
+            if keyword not in spellings:
+                spellings.append(keyword)
+        distinct_count = sum(len(spellings) for spellings in groups.values())
+        logger.info(f"Read {total_count} keywords, {distinct_count} distinct, {len(groups)} searches needed")
 
-            # Skip if already processed (resumability)
-            if keyword in processed_keywords:
-                skipped_count += 1
-                continue
+        # Skip already processed keywords (resumability)
+        todo = [[keyword for keyword in spellings if keyword not in processed_keywords] for spellings in groups.values()]
+        todo = [spellings for spellings in todo if spellings]
 
-            try:
-                entities = search_wikidata_entities(keyword, limit=wikidata_limit)
-                matched_items = []
-                unmatched_items = []
-
-                for ent in entities:
-                    # Ensure label is present, if not, fetch via wbgetentities as fallback
-                    label = ent.get("label", "")
-                    qid = ent.get("id", "")
-                    if not label and qid:
-                        # Fallback: fetch entity label via API
+        processed_count = 0
+        skipped_count = distinct_count - sum(len(spellings) for spellings in todo)
+
+        # The resume set is not needed past this point; release it before the long lookup phase
+        del processed_keywords, groups
+
+        # Workers hand finished keywords to a single writer thread through a bounded queue
+        out_q = queue.Queue(maxsize=256)
+
+        def writer():
+            nonlocal processed_count
+            while True:
+                item = out_q.get()
+                if item is None:
+                    break
+                keyword, matched_items, unmatched_items = item
+                try:
+                    if matched_items:
+                        matched_writer.writerows(matched_items)
+                    elif unmatched_items:
+                        unmatched_writer.writerows(unmatched_items)
+
+                    processed_count += 1
+                    # Flush periodically; an interrupted run resumes from whatever reached disk
+                    if processed_count % 50 == 0:
+                        matchedfile.flush()
+                        unmatchedfile.flush()
+                    logger.info(f"Processed keyword: {keyword} ({processed_count} processed, {skipped_count} skipped)")
+                except Exception as e:
+                    logger.error(f"Error writing results for '{keyword}': {e}")
+
+        def put(item):
+            # Time out periodically so producers never block forever on a dead writer
+            while writer_thread.is_alive():
+                try:
+                    out_q.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    pass
+            raise RuntimeError("CSV writer thread has stopped")
+
+        def worker(spellings):
+            hits = _fetch_hits(spellings[0], wikidata_limit)
+            for keyword in spellings:
+                put((keyword, *_score_hits(keyword, hits, min_score)))
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(worker, spellings): spellings[0] for spellings in todo}
+                try:
+                    for future in as_completed(futures):
                         try:
-                            p = {
-                                "action": "wbgetentities",
-                                "ids": qid,
-                                "format": "json",
-                                "props": "labels",
-                                "languages": "en"
-                            }
-                            relabel_req = requests.get(WIKIDATA_API, params=p, headers=HEADERS, timeout=15)
-                            relabel_req.raise_for_status()
-                            label = relabel_req.json()["entities"].get(qid, {}).get("labels", {}).get("en", {}).get("value", "")
+                            future.result()
                         except Exception as e:
-                            logger.error(f"Error fetching label for {qid}: {e}")
-                            label = ""  # Still blank if not found
-
-                    aliases = ent.get("aliases", [])
-                    score_label = token_sort_ratio(keyword, label) if label else 0
-                    scores_aliases = [token_sort_ratio(keyword, alias) for alias in aliases]
-                    best_score = max([score_label] + scores_aliases) if (label or aliases) else 0
-
-                    inst_qids, inst_labels, sub_qids, sub_labels = get_instances_and_subclasses(qid)
-                    wiki_link = get_wikipedia_link(qid)
-
-                    result_row = [
-                        keyword,
-                        qid,
-                        label,
-                        best_score,
-                        "; ".join(inst_qids), "; ".join(inst_labels),
-                        "; ".join(sub_qids), "; ".join(sub_labels),
-                        wiki_link
-                    ]
-
-                    if best_score >= min_score:
-                        matched_items.append(result_row)
-                    else:
-                        unmatched_items.append(result_row)
-
-                # Write results immediately (on-the-go updates)
-                if matched_items:
-                    for row_data in matched_items:
-                        matched_writer.writerow(row_data)
-                    matchedfile.flush()  # Ensure data is written to disk
-                elif unmatched_items:
-                    for row_data in unmatched_items:
-                        unmatched_writer.writerow(row_data)
-                    unmatchedfile.flush()  # Ensure data is written to disk
-
-                processed_count += 1
-                logger.info(f"Processed keyword: {keyword} ({processed_count} processed, {skipped_count} skipped)")
-
-            except Exception as e:
-                logger.error(f"Error processing keyword '{keyword}': {e}")
-                # Continue processing other keywords even if one fails
+                            logger.error(f"Error processing keyword '{futures[future]}': {e}")
+                            # Continue processing other keywords even if one fails
+                except BaseException:
+                    # Drop queued keywords so Ctrl-C stops promptly; they are picked up on resume
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        finally:
+            # Let the writer drain finished keywords before the output files are closed
+            try:
+                put(None)
+            except RuntimeError:
+                pass
+            writer_thread.join()
+            matchedfile.flush()
+            unmatchedfile.flush()
 
         logger.info(f"Processing complete. Total processed: {processed_count}, Total skipped: {skipped_count}")
 
 # Usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match MeSH keywords against Wikidata.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"keywords looked up in parallel (default: {MAX_WORKERS})")
+    parser.add_argument("--sync", action="store_true",
+                        help="look up one keyword at a time (same as --workers 1)")
+    args = parser.parse_args()
+
     process_keywords(
         input_csv='list_wiki.csv',
         matched_csv='matched_output.csv',
         unmatched_csv='unmatched_output.csv',
         wikidata_limit=5,
-        min_score=80
+        min_score=80,
+        max_workers=1 if args.sync else max(1, args.workers)
     )